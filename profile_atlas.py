@@ -0,0 +1,270 @@
+"""Stress profiles for the three-layer soil column and a precomputed atlas of them.
+
+The geometry sliders move on a fixed lattice, so for the default unit weights the
+profiles can be computed once, offline, and stored as breakpoints in a binary file:
+
+    python profile_atlas.py --output profile_atlas.bin
+
+The app memory-maps that file read-only, so every worker process shares the same
+page-cache copy and lattice hits need no computation at all.
+"""
+import argparse
+import hashlib
+import inspect
+import itertools
+import logging
+import os
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+GAMMA_WATER = 10  # kN/m³ for water
+DEPTH_STEP = 0.05  # m between sampled depths
+LATTICE_STEP = 0.25  # m, step of the z-1, z-2, z-3, h-1 and h-3 sliders
+
+# Unit weights the layout starts with, in update_graphs argument order:
+# gama_1, gama_r_1, gama_2, gama_r_2, gama_3, gama_r_3
+DEFAULT_UNIT_WEIGHTS = (18, 19, 19, 21, 18, 19)
+
+# Upper bound on breakpoints per profile (start, end and every kink in between)
+MAX_BREAKPOINTS = 6
+# Second differences below this (kPa) are treated as a straight line
+BREAKPOINT_TOLERANCE = 1e-6
+
+ATLAS_MAGIC = b'WISATLAS'
+ATLAS_VERSION = 2
+_HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('breakpoints', '<u4'),
+    ('shape', '<u4', (5,)),  # lattice points along z1, z2, z3, h1, h3
+    ('step', '<f8'),
+    ('unit_weights', '<f8', (6,)),
+    ('depth_step', '<f8'),
+    ('gamma_water', '<f8'),
+    ('fingerprint', 'S16'),  # see _fingerprint()
+])
+_HEADER_SIZE = 128
+
+
+def compute_profiles(z1, z2, z3, h1, h3, gama_1, gama_r_1, gama_2, gama_r_2, gama_3, gama_r_3):
+    """Sample total stress, pore pressure and effective stress over the full depth.
+
+    Returns ``(depths, total_stress, pore_pressure, effective_stress)``.
+    """
+    depths = np.linspace(0, z1 + z2 + z3, num=int((z1 + z2 + z3)/DEPTH_STEP) + 1, endpoint=True)
+    total_stress = np.zeros_like(depths)
+    pore_pressure = np.zeros_like(depths)
+
+    # condition for the first layer
+    layer = depths <= z1
+    depth = depths[layer]
+    dry = depth <= (z1 - h1)
+    pore_pressure[layer] = np.where(dry, 0, (depth - (z1 - h1)) * GAMMA_WATER)
+    total_stress[layer] = np.where(dry, depth * gama_1, (z1 - h1)*gama_1 + (depth - z1 + h1) * gama_r_1)
+
+    # condition for the second layer
+    layer = (depths > z1) & (depths <= z1 + z2)
+    if layer.any():
+        depth = depths[layer]
+        top = int(z1/DEPTH_STEP)
+        if (h1 + z2 + z3) == h3 or z3 == 0: # if h1=h3
+            pore_pressure[layer] = (depth - (z1 - h1)) * GAMMA_WATER
+            total_stress[layer] = total_stress[top] + (depth - z1) * gama_r_2
+        elif (h1 + z2 + z3) > h3: # if h1>h3
+            if h1 == 0:
+                dry = depth <= z1 + z2 + z3 - h3
+                pore_pressure[layer] = np.where(dry, pore_pressure[top],
+                                                (depth - z1 - (z2 + z3 - h3)) * GAMMA_WATER)
+                total_stress[layer] = np.where(dry, total_stress[top] + (depth - z1) * gama_2,
+                                               total_stress[top] + (z2 + z3 - h3) * gama_2 + (depth - z1 - (z2 + z3 - h3)) * gama_r_2)
+            else:
+                if h3 < z3:
+                    pore_pressure[layer] = ((1 - abs((h1 + z2)/z2)) * GAMMA_WATER * (depth - z1)) + pore_pressure[top]
+                else:
+                    pore_pressure[layer] = ((1 - abs(((h1 + z2 + z3) - h3)/z2)) * GAMMA_WATER * (depth - z1)) + pore_pressure[top]
+                total_stress[layer] = total_stress[top] + (depth - z1) * gama_r_2
+        else:  # if h1<h3
+            pore_pressure[layer] = ((1 + abs(((h1 + z2 + z3) - h3)/z2)) * GAMMA_WATER * (depth - z1)) + pore_pressure[top]
+            total_stress[layer] = total_stress[top] + (depth - z1) * gama_r_2
+
+    # condition for the third layer
+    layer = depths > z1 + z2
+    if layer.any():
+        depth = depths[layer]
+        top = int((z1 + z2)/DEPTH_STEP)
+        if (h1 + z2 + z3) == h3:
+            pore_pressure[layer] = (depth - (z1 - h1)) * GAMMA_WATER
+            total_stress[layer] = total_stress[top] + (depth - z1 - z2) * gama_r_3
+        elif (h1 + z2 + z3) > h3 and h3 < z3:
+            # The dry part has to be filled in first, the saturated part starts from it
+            dry = layer & (depths <= z1 + z2 + z3 - h3)
+            depth = depths[dry]
+            pore_pressure[dry] = pore_pressure[top]
+            total_stress[dry] = total_stress[top] + (depth - z1 - z2) * gama_3
+
+            wet = layer & ~dry
+            depth = depths[wet]
+            water_table = int((z1 + z2 + z3 - h3)/DEPTH_STEP)
+            pore_pressure[wet] = (depth - (z1 + z2 + z3 - h3)) * GAMMA_WATER + pore_pressure[water_table]
+            total_stress[wet] = total_stress[water_table] + (depth - (z1 + z2 + z3 - h3)) * gama_r_3
+        else:
+            pore_pressure[layer] = (depth - z1 - z2) * GAMMA_WATER + pore_pressure[top]
+            total_stress[layer] = total_stress[top] + (depth - z1 - z2) * gama_r_3
+
+    effective_stress = total_stress - pore_pressure
+    return depths, total_stress, pore_pressure, effective_stress
+
+
+def profile_breakpoints(depths, *profiles):
+    """Indices of the samples where any of the (evenly sampled) profiles changes slope.
+
+    Drawing the profiles through these points only gives the same lines as drawing
+    every sample.
+    """
+    keep = np.zeros(len(depths), dtype=bool)
+    keep[[0, -1]] = True
+    for profile in profiles:
+        keep[1:-1] |= np.abs(np.diff(profile, 2)) > BREAKPOINT_TOLERANCE
+    return np.flatnonzero(keep)
+
+
+def _fingerprint():
+    """Hash of the code and constants the stored breakpoints are computed with.
+
+    Editing the stress formulas changes it, so a stale atlas is refused instead of
+    serving profiles the live computation would no longer produce.
+    """
+    source = inspect.getsource(compute_profiles) + inspect.getsource(profile_breakpoints)
+    source += f'{DEPTH_STEP} {GAMMA_WATER} {BREAKPOINT_TOLERANCE}'
+    return hashlib.sha256(source.encode()).hexdigest()[:16].encode()
+
+
+def _lattice(maximum):
+    return np.arange(int(round(maximum / LATTICE_STEP)) + 1) * LATTICE_STEP
+
+
+def build_atlas(path, z_max=4, h1_max=4, h3_max=8, unit_weights=DEFAULT_UNIT_WEIGHTS):
+    """Precompute the profile breakpoints for every lattice point up to the given maxima."""
+    axes = [_lattice(z_max), _lattice(z_max), _lattice(z_max), _lattice(h1_max), _lattice(h3_max)]
+    shape = tuple(len(axis) for axis in axes)
+
+    header = np.zeros(1, dtype=_HEADER)
+    header['magic'] = ATLAS_MAGIC
+    header['version'] = ATLAS_VERSION
+    header['breakpoints'] = MAX_BREAKPOINTS
+    header['shape'] = shape
+    header['step'] = LATTICE_STEP
+    header['unit_weights'] = unit_weights
+    header['depth_step'] = DEPTH_STEP
+    header['gamma_water'] = GAMMA_WATER
+    header['fingerprint'] = _fingerprint()
+    counts_offset, profiles_offset = _offsets(shape)
+
+    # Write next to the target and swap it in, so running apps never map a half-built file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.tobytes().ljust(_HEADER_SIZE, b'\0'))
+    counts = np.memmap(tmp_path, dtype=np.uint8, mode='r+', offset=counts_offset, shape=shape)
+    profiles = np.memmap(tmp_path, dtype='<f4', mode='r+', offset=profiles_offset,
+                         shape=shape + (MAX_BREAKPOINTS, 4))
+
+    for index in itertools.product(*(range(n) for n in shape)):
+        z1, z2, z3, h1, h3 = (axis[i] for axis, i in zip(axes, index))
+        sampled = compute_profiles(z1, z2, z3, h1, h3, *unit_weights)
+        points = profile_breakpoints(*sampled)
+        if len(points) > MAX_BREAKPOINTS:
+            raise ValueError(f'{len(points)} breakpoints for z={z1, z2, z3}, h={h1, h3}; '
+                             f'raise MAX_BREAKPOINTS')
+        counts[index] = len(points)
+        profiles[index][:len(points)] = np.column_stack(sampled)[points]
+
+    counts.flush()
+    profiles.flush()
+    del counts, profiles
+    os.replace(tmp_path, path)
+
+
+def _offsets(shape):
+    counts_offset = _HEADER_SIZE
+    # Keep the float data 8-byte aligned
+    profiles_offset = counts_offset + -(-int(np.prod(shape)) // 8) * 8
+    return counts_offset, profiles_offset
+
+
+def _atlas_size(shape, breakpoints):
+    return _offsets(shape)[1] + int(np.prod(shape)) * breakpoints * 4 * 4
+
+
+class ProfileAtlas:
+    """Read-only, memory-mapped view of an atlas written by :func:`build_atlas`."""
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=_HEADER, count=1)
+        if len(header) != 1 or header['magic'][0] != ATLAS_MAGIC:
+            raise ValueError(f'{path} is not a profile atlas')
+        if header['version'][0] != ATLAS_VERSION:
+            raise ValueError(f'{path} has atlas version {header["version"][0]}, expected {ATLAS_VERSION}')
+        header = header[0]
+        if (header['depth_step'] != DEPTH_STEP or header['gamma_water'] != GAMMA_WATER
+                or header['fingerprint'] != _fingerprint()):
+            raise ValueError(f'{path} was built with different stress profiles, rebuild it')
+
+        self.shape = tuple(int(n) for n in header['shape'])
+        self.step = float(header['step'])
+        self.unit_weights = tuple(float(w) for w in header['unit_weights'])
+        breakpoints = int(header['breakpoints'])
+        size = os.path.getsize(path)
+        if size != _atlas_size(self.shape, breakpoints):
+            raise ValueError(f'{path} is {size} bytes, expected {_atlas_size(self.shape, breakpoints)}')
+
+        counts_offset, profiles_offset = _offsets(self.shape)
+        self._counts = np.memmap(path, dtype=np.uint8, mode='r', offset=counts_offset, shape=self.shape)
+        self._profiles = np.memmap(path, dtype='<f4', mode='r', offset=profiles_offset,
+                                   shape=self.shape + (breakpoints, 4))
+
+    def lookup(self, z1, z2, z3, h1, h3, unit_weights):
+        """Return the profile breakpoints like :func:`compute_profiles`, or None on a miss.
+
+        Misses are geometries off the lattice or outside the atlas, and unit weights
+        other than the ones the atlas was built for.
+        """
+        if tuple(unit_weights) != self.unit_weights:
+            return None
+        index = []
+        for value, size in zip((z1, z2, z3, h1, h3), self.shape):
+            i = round(value / self.step)
+            if not 0 <= i < size or value != i * self.step:
+                return None
+            index.append(i)
+        index = tuple(index)
+
+        depths, total_stress, pore_pressure, effective_stress = self._profiles[index][:self._counts[index]].T
+        return depths, total_stress, pore_pressure, effective_stress
+
+
+def load_atlas(path):
+    """Open the atlas at ``path``, or return None if it is missing or unusable.
+
+    The app then computes every profile live, so a bad atlas never stops it starting.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return ProfileAtlas(path)
+    except (OSError, ValueError) as e:
+        logger.warning('Ignoring profile atlas, computing profiles live: %s', e)
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the stress profile atlas for the slider lattice.')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_atlas.bin'))
+    parser.add_argument('--z-max', type=float, default=4, help='largest Z1, Z2 and Z3 in the atlas (m)')
+    parser.add_argument('--h1-max', type=float, default=4, help='largest h1 in the atlas (m)')
+    parser.add_argument('--h3-max', type=float, default=8, help='largest h3 in the atlas (m)')
+    args = parser.parse_args()
+
+    build_atlas(args.output, z_max=args.z_max, h1_max=args.h1_max, h3_max=args.h3_max)
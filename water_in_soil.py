@@ -5,12 +5,18 @@ from dash.dependencies import Input, Output, State
 import numpy as np
 import plotly.graph_objs as go
 
+from profile_atlas import GAMMA_WATER, compute_profiles, load_atlas
+
 
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
 
 app.title = 'Water in Soils'
 app._favicon = ('assets/favicon.ico')
 
+# Precomputed stress profiles for the slider lattice, built offline with
+# `python profile_atlas.py`; memory-mapped read-only so all workers share one copy
+atlas = load_atlas(os.environ.get('PROFILE_ATLAS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_atlas.bin')))
+
 # Updated layout with sliders on top and layer properties below
 app.layout = html.Div([
     dcc.Store(id='window-width'),
@@ -489,73 +495,17 @@ def update_graphs(n_clicks, z1, z2, z3, h1, h3, gama_1, gama_r_1, gama_2, gama_r
                 zeroline=False),
         )
 
-    # Calculate pore water pressure based on conditions
-    step = 0.05
-    depths = np.linspace(0, z1 + z2 + z3, num=int((z1 + z2 + z3)/step) + 1, endpoint=True)  # Define depths from 0 to total depth
-    total_stress = np.zeros_like(depths)
-    pore_pressure = np.zeros_like(depths)
-    effective_stress = np.zeros_like(depths)
-
-        # Constants
-    gamma_water = 10 # kN/m³ for water
-
-
-    # Calculate pore pressure based on the conditions
-    for i, depth in enumerate(depths):
-        # condition for the first layer
-        if depth <= z1:
-            if depth <= (z1 - h1):
-                pore_pressure[i] = 0
-                total_stress[i] = depth * gama_1
-            else:
-                pore_pressure[i] = (depth - (z1 - h1)) * gamma_water
-                total_stress[i] = (z1 - h1)*gama_1 + (depth - z1 + h1) * gama_r_1
-            effective_stress[i] = total_stress[i] - pore_pressure[i]
-
-        # condition for the second layer
-        elif depth <= z1 + z2:
-            if (h1 + z2 + z3) == h3 or z3 == 0: # if h1=h3
-                pore_pressure[i] = (depth - (z1 - h1)) * gamma_water
-                total_stress[i] = total_stress[int(z1/step)] + (depth - z1) * gama_r_2
-            elif (h1 + z2 + z3) > h3: # if h1>h3
-                if h1 == 0:
-                    if depth <= z1 + z2 + z3 - h3:
-                        pore_pressure[i] = pore_pressure[int(z1/step)] + 0
-                        total_stress[i] = total_stress[int(z1/step)] + (depth - z1) * gama_2
-                    else:
-                        pore_pressure[i] = (depth - z1 - (z2 + z3 - h3)) * gamma_water
-                        total_stress[i] = total_stress[int(z1/step)] +  (z2 + z3 - h3) * gama_2 + (depth - z1 - (z2 + z3 - h3)) * gama_r_2   
-                else:
-                    if h3 <  z3:
-                        pore_pressure[i] = ((1 - abs((h1 + z2 )/z2)) * gamma_water * (depth - z1)) + pore_pressure[int(z1/step)]
-                    else:
-                        pore_pressure[i] = ((1 - abs(((h1 + z2 + z3) - h3)/z2)) * gamma_water * (depth - z1)) + pore_pressure[int(z1/step)]
-                    total_stress[i] = total_stress[int(z1/step)] + (depth - z1) * gama_r_2
-            else:  # if h1<h3
-                pore_pressure[i] = ((1 + abs(((h1 + z2 + z3) - h3)/z2)) * gamma_water * (depth - z1))  + pore_pressure[int(z1/step)]
-                total_stress[i] = total_stress[int(z1/step)] + (depth - z1) * gama_r_2
-            effective_stress[i] = total_stress[i] - pore_pressure[i]
-
-        # condition for the third layer    
-        else:
-            if (h1 + z2 + z3) == h3:
-                pore_pressure[i] = (depth - (z1 - h1)) * gamma_water
-                total_stress[i] = total_stress[int((z1 + z2)/step)]+ (depth - z1 - z2) * gama_r_3
-            elif (h1 + z2 + z3) > h3:
-                if h3 < z3:
-                    if depth <= z1 + z2 + z3 - h3:
-                        pore_pressure[i] = 0 + pore_pressure[int((z1 + z2)/step)]
-                        total_stress[i] = total_stress[int((z1 + z2)/step)] + (depth - z1 - z2) * gama_3
-                    else:
-                        pore_pressure[i] = (depth - (z1 + z2 + z3 - h3)) * gamma_water +  pore_pressure[int((z1 + z2 + z3 - h3)/step)]
-                        total_stress[i] = total_stress[int((z1 + z2 + z3 - h3)/step)] + (depth - (z1 + z2 + z3 - h3)) * gama_r_3
-                else:
-                    total_stress[i] = total_stress[int((z1 + z2)/step)]+ (depth - z1 - z2) * gama_r_3
-                    pore_pressure[i] = (depth - z1 - z2) * gamma_water + pore_pressure[int((z1 + z2)/step)]
-            else:
-                pore_pressure[i] = (depth - z1 - z2) * gamma_water + pore_pressure[int((z1 + z2)/step)]
-                total_stress[i] = total_stress[int((z1 + z2)/step)]+ (depth - z1 - z2) * gama_r_3
-            effective_stress[i] = total_stress[i] - pore_pressure[i]
+    # Serve lattice geometries with the default unit weights from the precomputed atlas,
+    # compute everything else live
+    profiles = None
+    if atlas is not None:
+        profiles = atlas.lookup(z1, z2, z3, h1, h3, (gama_1, gama_r_1, gama_2, gama_r_2, gama_3, gama_r_3))
+    if profiles is None:
+        profiles = compute_profiles(z1, z2, z3, h1, h3, gama_1, gama_r_1, gama_2, gama_r_2, gama_3, gama_r_3)
+    depths, total_stress, pore_pressure, effective_stress = profiles
+
+    # Constants
+    gamma_water = GAMMA_WATER # kN/m³ for water
 
 
     # Create the pore pressure figure